@@ -1,31 +1,40 @@
 from flask import Flask, request, jsonify, render_template
-from openai import OpenAI
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
-from dotenv import load_dotenv
-from task_manager import handle_task_command, clear_tasks_json
-from scheduler import handle_schedule_action
+from clients import get_completion_from_messages, get_openai_client, load_environment
+from task_manager import handle_task_command, clear_tasks_json, search_tasks, get_task_changes
+from scheduler import handle_schedule_action, warm_up_calendar
+from rate_limiter import (
+    AdmissionRejected,
+    estimate_text_tokens,
+    get_admission_controller,
+    raise_if_rate_limited,
+    retry_after_header,
+)
 import utils
 import json
 
-# Load environment variables
-load_dotenv()
-
-# Set OpenAI API key
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-
 # Initialize Flask app
 app = Flask(__name__)
 
-def get_completion_from_messages(messages, model="gpt-3.5-turbo", temperature=0, max_tokens=500):
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature, 
-        max_tokens=max_tokens, 
-    )
-    return response.choices[0].message.content
+def warm_up():
+    """
+    Builds the shared OpenAI client and the Google Calendar service ahead of the first request,
+    so the worker does not pay the import and connection cost while serving traffic.
+    """
+    get_openai_client()
+    warm_up_calendar()
+
+# Warm up inside the serving process, before it takes traffic
+load_environment()
+if os.getenv("WARM_UP_ON_START"):
+    warm_up()
+
+# Behind a load balancer or proxy, take the client address from X-Forwarded-For
+# so each user keeps their own admission budget. Only enable this for trusted proxies.
+trusted_proxies = int(os.getenv("TRUSTED_PROXIES", "0"))
+if trusted_proxies:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies)
 
 def get_model_response(user_input, system_message):
     """
@@ -41,12 +50,50 @@ def get_model_response(user_input, system_message):
     response = get_completion_from_messages(messages)
     return response
 
+def estimate_completion_tokens(system_message, user_input, max_tokens=500):
+    """
+    Rough token estimate for one get_model_response call.
+    """
+    return estimate_text_tokens(system_message) + estimate_text_tokens(user_input) + max_tokens
+
+def message_admission_budget(user_input):
+    """
+    Returns the OpenAI requests and tokens every message needs: moderation and classification.
+    """
+    openai_requests = 2
+    openai_tokens = estimate_text_tokens(user_input) + estimate_completion_tokens(utils.get_classification_prompt(), user_input)
+    return openai_requests, openai_tokens
+
+def reserve_message_budget(items):
+    """
+    Reserves the OpenAI and Calendar budget for every classified request of a message at once.
+    Task requests may need a second completion for help instructions.
+    """
+    openai_requests = 0
+    openai_tokens = 0
+    calendar = 0
+    for classification, info in items:
+        category = classification.get("category")
+        if category == "task":
+            openai_requests += 2
+            openai_tokens += 2 * estimate_completion_tokens(utils.get_task_prompt(), info)
+        elif category == "schedule":
+            openai_requests += 1
+            openai_tokens += estimate_completion_tokens(utils.get_schedule_prompt(), info)
+            calendar += 1
+    get_admission_controller().reserve(openai_requests, openai_tokens, calendar)
+
 def process_user_message(user_input, debug=True):
     """
     Process user input and return appropriate responses based on the classification.
     """
     # Step 1: Check input to see if it flags the Moderation API
-    response = client.moderations.create(input=user_input)
+    get_admission_controller().acquire_openai(estimate_text_tokens(user_input))
+    try:
+        response = get_openai_client().moderations.create(input=user_input)
+    except Exception as e:
+        raise_if_rate_limited(e, ["openai_requests"])
+        raise
     moderation_output = response.results[0]
 
     if moderation_output.flagged:
@@ -72,53 +119,73 @@ def process_user_message(user_input, debug=True):
         print("Step 2a: Parsed classifications:", classifications)
         print("Step 2b: Parsed extracted information:", details)
 
-    # Step 3: Handle the requests
+    # Step 3: Reserve the budget for all requests before any of them changes state
+    items = list(zip(classifications, details))
+    reserve_message_budget(items)
+
+    # Step 4: Handle the requests
     responses = []
-    for classification, info in zip(classifications, details):
+    for position, (classification, info) in enumerate(items):
         category = classification.get("category")
 
-        if category == "task":
-            tasks_prompt = utils.get_task_prompt()
-            task_manager_response = get_model_response(info, tasks_prompt)
+        try:
+            if category == "task":
+                tasks_prompt = utils.get_task_prompt()
+                task_manager_response = get_model_response(info, tasks_prompt)
             
-            # Parse task_manager_response
-            try:
-                task_action = json.loads(task_manager_response).get("task_action", {})
-                task_details = json.loads(task_manager_response).get("details", {})
-            except Exception as e:
-                if debug: print(f"Error parsing tasks response: {e}")
-                return "I'm sorry, I couldn't understand your request."
+                # Parse task_manager_response
+                try:
+                    task_action = json.loads(task_manager_response).get("task_action", {})
+                    task_details = json.loads(task_manager_response).get("details", {})
+                except Exception as e:
+                    if debug: print(f"Error parsing tasks response: {e}")
+                    return "I'm sorry, I couldn't understand your request."
             
-            try:
-                # Use task_manager to handle the specific task command
-                task_response = handle_task_command(task_action, task_details)
-                responses.append(task_response)
-            except Exception as e:
-                if debug: print(f"Error handling task command for {task_action} with info {task_details}:", e)
-                responses.append(f"Error handling task: {task_details}")
+                try:
+                    # Use task_manager to handle the specific task command
+                    task_response = handle_task_command(task_action, task_details)
+                    responses.append(task_response)
+                except AdmissionRejected:
+                    raise
+                except Exception as e:
+                    if debug: print(f"Error handling task command for {task_action} with info {task_details}:", e)
+                    responses.append(f"Error handling task: {task_details}")
                 
-        elif category == "schedule":
-            schedule_prompt = utils.get_schedule_prompt()
-            schedule_manager_response = get_model_response(info, schedule_prompt)
+            elif category == "schedule":
+                schedule_prompt = utils.get_schedule_prompt()
+                schedule_manager_response = get_model_response(info, schedule_prompt)
             
-            # Parse schedule_manager_response
-            try:
-                schedule_json = json.loads(schedule_manager_response)
-            except Exception as e:
-                if debug: print(f"Error parsing schedule response: {e}")
-                return "I'm sorry, I couldn't understand your request."
-            
-            if debug: print(f"Schedule json: {schedule_json}")
-            # Call handle_schedule_action with the parsed JSON
-            try:
-                schedule_action_result = handle_schedule_action(schedule_json)
-                responses.append(schedule_action_result)
-            except Exception as e:
-                if debug: print(f"Error handling schedule action: {e}")
-                responses.append("An error occurred while processing your schedule request.")        
-        else:
-            return f"I couldn't classify your request. Please try again. (category = {category})"
+                # Parse schedule_manager_response
+                try:
+                    schedule_json = json.loads(schedule_manager_response)
+                except Exception as e:
+                    if debug: print(f"Error parsing schedule response: {e}")
+                    return "I'm sorry, I couldn't understand your request."
             
+                if debug: print(f"Schedule json: {schedule_json}")
+                # Call handle_schedule_action with the parsed JSON
+                try:
+                    get_admission_controller().acquire_calendar()
+                    schedule_action_result = handle_schedule_action(schedule_json)
+                    responses.append(schedule_action_result)
+                except AdmissionRejected:
+                    raise
+                except Exception as e:
+                    if debug: print(f"Error handling schedule action: {e}")
+                    responses.append("An error occurred while processing your schedule request.")        
+            else:
+                return f"I couldn't classify your request. Please try again. (category = {category})"
+
+        except AdmissionRejected as e:
+            # Earlier requests may already have been saved, so keep their results instead of failing with 503
+            if not responses:
+                raise
+            if debug: print(f"Request rejected by admission control: {e}")
+            responses.extend(
+                f'Could not handle "{remaining_info}" right now. Please try again later.'
+                for _, remaining_info in items[position:]
+            )
+            break
 
     return "\n".join(responses)
 
@@ -130,7 +197,12 @@ def home():
 def process_input():
     user_input = json.loads(request.data.decode('utf-8')).get("user_input")  # Get input from the form
     
-    response = process_user_message(user_input, debug=False)  # Process the input
+    openai_requests, openai_tokens = message_admission_budget(user_input)
+    try:
+        with get_admission_controller().request(request.remote_addr, openai_requests, openai_tokens):
+            response = process_user_message(user_input, debug=False)  # Process the input
+    except AdmissionRejected as e:
+        return jsonify({"response": str(e)}), 503, {"Retry-After": retry_after_header(e.retry_after)}
     
     return jsonify({"response": response})  # Return the response as JSON
 
@@ -143,6 +215,22 @@ def get_tasks():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
+@app.route("/tasks/changes", methods=["GET"])
+def get_tasks_changes():
+    since = request.args.get("since", 0, type=int)
+    try:
+        return jsonify(get_task_changes(since))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+@app.route("/tasks/search", methods=["GET"])
+def search_tasks_route():
+    query = request.args.get("q", "")
+    try:
+        return jsonify(search_tasks(query))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
 @app.route("/clear-tasks", methods=["POST"])
 def clear_tasks():
     try:
@@ -0,0 +1,64 @@
+"""
+clients.py
+----------
+
+Shared, lazily constructed clients for the external services used by the assistant.
+Heavy dependencies (openai, dotenv) are only imported the first time a client is
+requested, so importing the app stays cheap and every module reuses the same instance.
+Chat completions go through admission control before they reach OpenAI.
+"""
+
+import os
+import threading
+
+_lock = threading.Lock()
+_env_loaded = False
+_openai_client = None
+
+
+def load_environment():
+    """
+    Loads the variables from the .env file once per process.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def get_openai_client():
+    """
+    Returns the shared OpenAI client, creating it on first use.
+    """
+    global _openai_client
+    if _openai_client is None:
+        load_environment()
+        with _lock:
+            if _openai_client is None:
+                from openai import OpenAI
+                _openai_client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY")
+                )
+    return _openai_client
+
+
+def get_completion_from_messages(messages, model="gpt-3.5-turbo", temperature=0, max_tokens=500):
+    # Imported here because rate_limiter itself depends on this module
+    from rate_limiter import estimate_tokens, get_admission_controller, raise_if_rate_limited
+
+    get_admission_controller().acquire_openai(estimate_tokens(messages, max_tokens))
+    try:
+        response = get_openai_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature, 
+            max_tokens=max_tokens, 
+        )
+    except Exception as e:
+        raise_if_rate_limited(e, ["openai_requests", "openai_tokens"])
+        raise
+    return response.choices[0].message.content
@@ -0,0 +1,328 @@
+"""
+rate_limiter.py
+---------------
+
+Admission control for the external APIs used by the assistant.
+Token buckets keep OpenAI requests/tokens per minute, Google Calendar queries per second
+and each user's request rate within budget. Requests wait for capacity up to a bounded
+time and are otherwise rejected early, so the app can answer with 503 + Retry-After
+instead of hitting the provider limits.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from clients import load_environment
+
+# Google reports most quota errors as 403 with one of these reasons
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request cannot be served within the allowed wait time.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills at `rate` tokens per second up to `capacity`.
+    Tokens may go negative, which queues the callers that already reserved them.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Returns how many seconds the caller has to wait before `amount` tokens are available.
+        """
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class Ticket:
+    """
+    State of an admitted request: its deadline and the budget reserved for it up front.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.reserved = {"openai_requests": 0, "openai_tokens": 0, "calendar": 0}
+
+
+class AdmissionController:
+    """
+    Keeps the budgets shared by all requests and a bucket per user for fairness.
+    Requests admitted through `request()` share a single deadline across all of their API calls.
+    """
+
+    MAX_USERS = 10000
+
+    def __init__(self, openai_rpm, openai_tpm, calendar_qps, user_rpm, user_burst, max_wait):
+        self.max_wait = max_wait
+        self.user_rpm = user_rpm
+        self.user_burst = user_burst
+        self.buckets = {
+            "openai_requests": TokenBucket(openai_rpm / 60, openai_rpm),
+            "openai_tokens": TokenBucket(openai_tpm / 60, openai_tpm),
+            "calendar": TokenBucket(calendar_qps, calendar_qps),
+        }
+        self.users = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _user_bucket(self, user_id, now):
+        bucket = self.users.get(user_id)
+        if bucket is None:
+            if len(self.users) >= self.MAX_USERS:
+                self._prune_users(now)
+            bucket = TokenBucket(self.user_rpm / 60, self.user_burst)
+            self.users[user_id] = bucket
+        return bucket
+
+    def _prune_users(self, now):
+        # Users whose bucket has refilled completely have been idle and can be dropped
+        for user_id, bucket in list(self.users.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self.users[user_id]
+
+    def _ticket(self):
+        return getattr(self._local, "ticket", None)
+
+    def _remaining_wait(self, now):
+        ticket = self._ticket()
+        if ticket is None:
+            return self.max_wait
+        return max(0.0, ticket.deadline - now)
+
+    def _acquire(self, costs, description):
+        """
+        Reserves all `costs` (bucket name, amount) at once, then waits until they are available.
+        Nothing is reserved if the wait would go past the request deadline.
+        """
+        costs = [(name, amount) for name, amount in costs if amount > 0]
+        if not costs:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            for name, amount in costs:
+                bucket = self.buckets[name]
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+            if wait > self._remaining_wait(now):
+                raise AdmissionRejected(f"Too many requests for {description}. Please try again later.", wait)
+            for name, amount in costs:
+                self.buckets[name].take(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _use_reserved(self, costs, description):
+        """
+        Pays `costs` from the budget reserved by the current request first, acquiring only the rest.
+        """
+        ticket = self._ticket()
+        if ticket is None:
+            self._acquire(costs, description)
+            return
+        missing = [(name, max(0, amount - ticket.reserved[name])) for name, amount in costs]
+        self._acquire(missing, description)
+        for name, amount in costs:
+            ticket.reserved[name] = max(0, ticket.reserved[name] - amount)
+
+    def admit(self, user_id, costs=()):
+        """
+        Admits a new user message. Checks the user's own budget and takes the fixed `costs`
+        (bucket name, amount) every message needs, so the message is shed before any provider call
+        when that budget is exhausted beyond the allowed wait.
+        Returns the deadline for the whole request.
+        """
+        costs = [(name, amount) for name, amount in costs if amount > 0]
+        with self._lock:
+            now = time.monotonic()
+            deadline = now + self.max_wait
+            user_bucket = self._user_bucket(user_id, now)
+            user_bucket.refill(now)
+            user_wait = user_bucket.wait_time(1)
+            provider_wait = 0.0
+            for name, amount in costs:
+                bucket = self.buckets[name]
+                bucket.refill(now)
+                provider_wait = max(provider_wait, bucket.wait_time(amount))
+            if user_wait > self.max_wait:
+                raise AdmissionRejected("You are sending requests too quickly. Please try again later.", user_wait)
+            if provider_wait > self.max_wait:
+                raise AdmissionRejected("The assistant is busy. Please try again later.", provider_wait)
+            user_bucket.take(1)
+            for name, amount in costs:
+                self.buckets[name].take(amount)
+        wait = max(user_wait, provider_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return deadline
+
+    @contextmanager
+    def request(self, user_id, openai_requests=0, openai_tokens=0):
+        """
+        Admits a user message and tracks its deadline and reserved budget until the block exits.
+        The OpenAI budget given here is reserved at admission for the calls every message makes.
+        Reserved budget that was not used is returned to the buckets.
+        """
+        costs = [("openai_requests", openai_requests), ("openai_tokens", openai_tokens)]
+        ticket = Ticket(self.admit(user_id, costs))
+        for name, amount in costs:
+            ticket.reserved[name] += amount
+        self._local.ticket = ticket
+        try:
+            yield ticket
+        finally:
+            self._local.ticket = None
+            with self._lock:
+                now = time.monotonic()
+                for name, amount in ticket.reserved.items():
+                    bucket = self.buckets[name]
+                    bucket.refill(now)
+                    bucket.tokens = min(bucket.capacity, bucket.tokens + amount)
+
+    def reserve(self, openai_requests=0, openai_tokens=0, calendar=0):
+        """
+        Reserves the budget for the remaining steps of the current request at once,
+        so the request is rejected before any step with side effects has run.
+        """
+        costs = [("openai_requests", openai_requests), ("openai_tokens", openai_tokens), ("calendar", calendar)]
+        self._acquire(costs, "the assistant")
+        ticket = self._ticket()
+        if ticket is not None:
+            for name, amount in costs:
+                ticket.reserved[name] += amount
+
+    def acquire_openai(self, tokens):
+        """
+        Waits for budget for a single OpenAI request using an estimated number of tokens.
+        """
+        self._use_reserved([("openai_requests", 1), ("openai_tokens", tokens)], "the OpenAI API")
+
+    def acquire_calendar(self):
+        """
+        Waits for budget for a single Google Calendar API request.
+        """
+        self._use_reserved([("calendar", 1)], "the Google Calendar API")
+
+    def back_off(self, bucket_names, seconds):
+        """
+        Empties the given buckets so that no request is sent for `seconds`,
+        used when the provider itself answers with 429.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for name in bucket_names:
+                bucket = self.buckets[name]
+                bucket.refill(now)
+                bucket.tokens = min(bucket.tokens, -seconds * bucket.rate)
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller():
+    """
+    Returns the shared admission controller, configured from the environment on first use.
+    """
+    global _controller
+    if _controller is None:
+        load_environment()
+        with _controller_lock:
+            if _controller is None:
+                # The budgets are kept per process, so split the provider limits between the workers
+                workers = max(1, int(os.getenv("WORKERS", "1")))
+                _controller = AdmissionController(
+                    openai_rpm=float(os.getenv("OPENAI_RPM", "500")) / workers,
+                    openai_tpm=float(os.getenv("OPENAI_TPM", "60000")) / workers,
+                    calendar_qps=float(os.getenv("CALENDAR_QPS", "10")) / workers,
+                    user_rpm=float(os.getenv("USER_RPM", "20")) / workers,
+                    user_burst=float(os.getenv("USER_BURST", "5")),
+                    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "5")),
+                )
+    return _controller
+
+
+def estimate_text_tokens(text):
+    """
+    Rough token estimate for a piece of text (about 4 characters per token).
+    """
+    return len(str(text)) // 4
+
+
+def estimate_tokens(messages, max_tokens):
+    """
+    Rough token estimate for a chat completion, prompt plus the longest possible answer.
+    """
+    return sum(estimate_text_tokens(message["content"]) for message in messages) + max_tokens
+
+
+def _error_reasons(error):
+    """
+    Returns the reasons listed in a Google API error body, e.g. "rateLimitExceeded".
+    """
+    details = getattr(error, "error_details", None)
+    if not isinstance(details, list):
+        try:
+            content = json.loads(getattr(error, "content", b"") or b"{}")
+            details = content.get("error", {}).get("errors", [])
+        except (AttributeError, TypeError, ValueError):
+            details = []
+    return {detail.get("reason") for detail in details if isinstance(detail, dict)}
+
+
+def raise_if_rate_limited(error, bucket_names, default_retry_after=10):
+    """
+    Turns a rate limit response from OpenAI or Google into AdmissionRejected and backs off the matching buckets.
+    That is a 429, or a 403 whose reason is a rate limit or quota error. Other errors are left to the caller.
+    """
+    response = getattr(error, "response", None) or getattr(error, "resp", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return
+    if status != 429 and not (status == 403 and _error_reasons(error) & RATE_LIMIT_REASONS):
+        return
+
+    headers = getattr(response, "headers", None)
+    if headers is None and isinstance(response, dict):
+        headers = response
+    try:
+        retry_after = float(headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        retry_after = default_retry_after
+
+    get_admission_controller().back_off(bucket_names, retry_after)
+    raise AdmissionRejected("The assistant is busy. Please try again later.", retry_after) from error
+
+
+def retry_after_header(seconds):
+    """
+    Formats a wait time for the Retry-After header.
+    """
+    return str(max(1, math.ceil(seconds)))
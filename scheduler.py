@@ -9,19 +9,29 @@ such as creating new events or checking upcoming meetings.
 
 import datetime
 import os
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import queue
+import threading
+from contextlib import contextmanager
+from rate_limiter import raise_if_rate_limited
 
 # Define the scope (read/write access to calendar events)
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
-def authenticate_google_calendar():
+# The service and the credentials are shared by the whole process.
+# httplib2 connections are not thread-safe, so requests borrow one from a pool instead.
+_service = None
+_credentials = None
+_service_lock = threading.Lock()
+_http_pool = queue.LifoQueue()
+
+def load_credentials():
     """
-    Authenticates the user and returns the Google Calendar API service object.
+    Loads the saved Google credentials, refreshing them or running the OAuth flow when needed.
     """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
     token_path = "token.json"
     
@@ -40,6 +50,16 @@ def authenticate_google_calendar():
         with open(token_path, "w") as token:
             token.write(creds.to_json())
 
+    return creds
+
+
+def build_calendar_service(creds):
+    """
+    Builds the Google Calendar API service object for the given credentials.
+    """
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+
     try:
         # Build the Google Calendar service
         service = build("calendar", "v3", credentials=creds)
@@ -49,10 +69,68 @@ def authenticate_google_calendar():
         return None
 
 
+def authenticate_google_calendar():
+    """
+    Authenticates the user and returns the Google Calendar API service object.
+    """
+    return build_calendar_service(load_credentials())
+
+
+def get_calendar_service():
+    """
+    Returns the shared Google Calendar service, authenticating on first use.
+    """
+    global _service, _credentials
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                creds = load_credentials()
+                service = build_calendar_service(creds)
+                if service is not None:
+                    _credentials = creds
+                    _service = service
+    return _service
+
+
+@contextmanager
+def calendar_connection():
+    """
+    Lends an authorized HTTP connection from the pool to pass to `execute(http=...)`.
+    Raises RuntimeError if the service could not be built, so no connection without credentials is pooled.
+    """
+    if get_calendar_service() is None or _credentials is None:
+        raise RuntimeError("The Google Calendar service is not available.")
+
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+
+    try:
+        http = _http_pool.get_nowait()
+    except queue.Empty:
+        http = AuthorizedHttp(_credentials, http=httplib2.Http())
+    try:
+        yield http
+    finally:
+        _http_pool.put(http)
+
+
+def warm_up_calendar():
+    """
+    Authenticates and prepares a pooled connection before the first request.
+    """
+    try:
+        with calendar_connection():
+            pass
+    except RuntimeError as error:
+        print(f"Calendar warm-up failed: {error}")
+
+
 def create_test_event(service):
     """
     Creates a test event for tomorrow at 11 PM in the user's Google Calendar.
     """
+    from googleapiclient.errors import HttpError
+
     # Calculate the date and time for tomorrow at 11 PM
     now = datetime.datetime.now()  # Local time
     tomorrow = now + datetime.timedelta(days=1)
@@ -91,8 +169,10 @@ def add_event(event_details):
     Returns:
         str: Confirmation message or error message.
     """
+    from googleapiclient.errors import HttpError
+
     try:
-        service = authenticate_google_calendar()
+        service = get_calendar_service()
         event = {
             "summary": event_details.get("title"),
             "description": event_details.get("description"),
@@ -105,9 +185,11 @@ def add_event(event_details):
                 "timeZone": event_details.get("time_zone"),
             },
         }
-        created_event = service.events().insert(calendarId="primary", body=event).execute()
+        with calendar_connection() as http:
+            created_event = service.events().insert(calendarId="primary", body=event).execute(http=http)
         return f"Event {event_details.get('title')} created: {created_event.get('htmlLink')}"
     except HttpError as error:
+        raise_if_rate_limited(error, ["calendar"])
         return f"An error occurred while adding the event: {error}"
     except Exception as e:
         return f"Unexpected error: {e}"
@@ -125,6 +207,8 @@ def view_events(start_time, end_time, time_zone):
     Returns:
         str: A list of events or a message indicating no events found.
     """
+    from googleapiclient.errors import HttpError
+
     try:
         # Convert times to ensure proper formatting
         start_time_obj = datetime.datetime.fromisoformat(start_time)
@@ -134,18 +218,19 @@ def view_events(start_time, end_time, time_zone):
         start_time_iso = start_time_obj.isoformat() + "Z"
         end_time_iso = end_time_obj.isoformat() + "Z"
 
-        service = authenticate_google_calendar()
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=start_time_iso,
-                timeMax=end_time_iso,
-                singleEvents=True,
-                orderBy="startTime",
+        service = get_calendar_service()
+        with calendar_connection() as http:
+            events_result = (
+                service.events()
+                .list(
+                    calendarId="primary",
+                    timeMin=start_time_iso,
+                    timeMax=end_time_iso,
+                    singleEvents=True,
+                    orderBy="startTime",
+                )
+                .execute(http=http)
             )
-            .execute()
-        )
         events = events_result.get("items", [])
         if not events:
             return "No events found in the specified time range."
@@ -157,6 +242,7 @@ def view_events(start_time, end_time, time_zone):
         
         return "\n".join(event_list)
     except HttpError as error:
+        raise_if_rate_limited(error, ["calendar"])
         return f"An error occurred while retrieving events: {error}"
     except Exception as e:
         return f"Unexpected error: {e}"
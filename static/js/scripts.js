@@ -6,9 +6,24 @@ document.addEventListener("DOMContentLoaded", () => {
     const tasksArea = document.querySelector(".tasksArea");
     const clearTasksButton = document.getElementById("clearTasksButton");
 
-    // Function to fetch and display tasks
+    // Latest task list version received from the server and the rendered list items by task id
+    let taskVersion = null;
+    let taskList = null;
+    const taskItems = new Map();
+
+    // Function to render a single task into its list item
+    function renderTask(listItem, task) {
+        // Set task description
+        listItem.textContent = task.description;
+
+        // Add a strikethrough for completed tasks
+        listItem.style.textDecoration = task.completed ? "line-through" : "";
+        listItem.style.color = task.completed ? "gray" : "";
+    }
+
+    // Function to fetch the task changes and patch the displayed list
     function displayTasks() {
-        fetch("/tasks")
+        fetch(`/tasks/changes?since=${taskVersion ?? 0}`)
             .then((response) => {
                 if (!response.ok) {
                     throw new Error("Failed to fetch tasks.");
@@ -16,30 +31,31 @@ document.addEventListener("DOMContentLoaded", () => {
                 return response.json();
             })
             .then((data) => {
-                const taskList = document.createElement("ol");
-
-                for (const [id, task] of Object.entries(data)) {
-                    const listItem = document.createElement("li");
-
-                    // Set task description
-                    listItem.textContent = task.description;
+                // Rebuild the list when the server sends the full task list
+                if (data.reset || taskList === null) {
+                    taskList = document.createElement("ol");
+                    taskItems.clear();
+                    tasksArea.innerHTML = "";
+                    tasksArea.appendChild(taskList);
+                }
 
-                    // Add a strikethrough for completed tasks
-                    if (task.completed) {
-                        listItem.style.textDecoration = "line-through";
-                        listItem.style.color = "gray";
+                for (const [id, task] of Object.entries(data.tasks)) {
+                    let listItem = taskItems.get(id);
+                    if (!listItem) {
+                        listItem = document.createElement("li");
+                        taskItems.set(id, listItem);
+                        taskList.appendChild(listItem);
                     }
-
-                    taskList.appendChild(listItem);
+                    renderTask(listItem, task);
                 }
 
-                // Clear any existing content and append the task list
-                tasksArea.innerHTML = "";
-                tasksArea.appendChild(taskList);
+                taskVersion = data.version;
             })
             .catch((error) => {
                 console.error("Error:", error);
                 tasksArea.innerHTML = "<p>Failed to load tasks.</p>";
+                taskVersion = null;
+                taskList = null;
             });
     }
 
@@ -125,6 +141,8 @@ document.addEventListener("DOMContentLoaded", () => {
                 console.log(result);
                 // Refresh the tasks displayed on the page
                 tasksArea.innerHTML = "<p>No tasks available.</p>";
+                taskVersion = null;
+                taskList = null;
             } else {
                 console.error("Failed to clear tasks. Please try again.");
             }
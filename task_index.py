@@ -0,0 +1,119 @@
+"""
+task_index.py
+-------------
+
+In-memory search index over task descriptions.
+Combines an inverted word index with a trigram index, so tasks can be found by name
+("the spaghetti task") or with small typos, without sending the whole task list to the model.
+"""
+
+import re
+import threading
+
+# Words that describe the request rather than the task itself
+STOP_WORDS = {
+    "a", "an", "the", "my", "me", "i", "to", "for", "with", "of", "on", "in", "and", "or",
+    "please", "task", "tasks", "help", "delete", "remove", "instructions", "give", "about",
+}
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase words, ignoring stop words.
+    """
+    return [word for word in re.findall(r"\w+", str(text).lower()) if word not in STOP_WORDS]
+
+
+def trigrams(words):
+    """
+    Returns the set of trigrams of the given words, padded as in pg_trgm.
+    """
+    result = set()
+    for word in words:
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TaskIndex:
+    """
+    Maps words and trigrams to task IDs. Only open tasks are kept in the index.
+    """
+
+    def __init__(self):
+        self.descriptions = {}
+        self.task_words = {}
+        self.task_trigrams = {}
+        self.words = {}
+        self.trigrams = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.descriptions)
+
+    def add(self, task_id, description):
+        task_id = str(task_id)
+        with self._lock:
+            self._remove(task_id)
+            words = set(tokenize(description))
+            grams = trigrams(words)
+            self.descriptions[task_id] = description
+            self.task_words[task_id] = words
+            self.task_trigrams[task_id] = grams
+            for word in words:
+                self.words.setdefault(word, set()).add(task_id)
+            for gram in grams:
+                self.trigrams.setdefault(gram, set()).add(task_id)
+
+    def remove(self, task_id):
+        with self._lock:
+            self._remove(str(task_id))
+
+    def _remove(self, task_id):
+        if task_id not in self.descriptions:
+            return
+        for word in self.task_words.pop(task_id):
+            ids = self.words[word]
+            ids.discard(task_id)
+            if not ids:
+                del self.words[word]
+        for gram in self.task_trigrams.pop(task_id):
+            ids = self.trigrams[gram]
+            ids.discard(task_id)
+            if not ids:
+                del self.trigrams[gram]
+        del self.descriptions[task_id]
+
+    def clear(self):
+        with self._lock:
+            self.descriptions.clear()
+            self.task_words.clear()
+            self.task_trigrams.clear()
+            self.words.clear()
+            self.trigrams.clear()
+
+    def search(self, query, limit=5, min_score=0.3):
+        """
+        Returns up to `limit` (task_id, description, score) tuples, best match first.
+        The score is the share of the query trigrams found in the task, plus a bonus for whole-word matches.
+        """
+        words = set(tokenize(query))
+        grams = trigrams(words)
+        if not grams:
+            return []
+
+        with self._lock:
+            hits = {}
+            for gram in grams:
+                for task_id in self.trigrams.get(gram, ()):
+                    hits[task_id] = hits.get(task_id, 0) + 1
+
+            results = []
+            for task_id, count in hits.items():
+                score = count / len(grams)
+                score += 0.5 * len(words & self.task_words[task_id]) / len(words)
+                if score >= min_score:
+                    results.append((task_id, self.descriptions[task_id], round(score, 3)))
+
+        results.sort(key=lambda result: (-result[2], result[0]))
+        return results[:limit]
@@ -9,25 +9,9 @@ and storing them persistently in a database or file.
 
 import os
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Set OpenAI API key
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-
-def get_completion_from_messages(messages, model="gpt-3.5-turbo", temperature=0, max_tokens=500):
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature, 
-        max_tokens=max_tokens, 
-    )
-    return response.choices[0].message.content
+import threading
+from clients import get_completion_from_messages
+from task_index import TaskIndex, tokenize
 
 def get_model_response(user_input, system_message):
     """
@@ -62,14 +46,181 @@ def save_tasks(tasks):
         json.dump(tasks, file, indent=4)
 
 
+# Change log used to send only the updated tasks to the frontend.
+# It is kept in a file next to the tasks, so every worker process sees the same versions.
+CHANGES_FILE = ".\\database\\tasks_changes.json"
+MAX_CHANGES = 1000
+_changes_lock = threading.Lock()
+_changes_cache = None
+
+def load_changes(cached=True):
+    """
+    Returns the change log: the current version, the version the log starts from
+    and the [version, task_id, task] changes after it.
+    With `cached`, the log is only read again when the file's modification time or size has changed.
+    """
+    global _changes_cache
+    try:
+        stat = os.stat(CHANGES_FILE)
+    except OSError:
+        # Version 0 never matches, so clients without a log get the full list
+        return {"version": 1, "log_start": 1, "changes": []}
+    key = (CHANGES_FILE, stat.st_mtime_ns, stat.st_size)
+    if not cached or _changes_cache is None or _changes_cache[0] != key:
+        with open(CHANGES_FILE, "r") as file:
+            try:
+                changes = json.load(file)
+            except json.JSONDecodeError:
+                changes = {"version": 1, "log_start": 1, "changes": []}
+        _changes_cache = (key, changes)
+    return _changes_cache[1]
+
+def save_changes(changes):
+    with open(CHANGES_FILE, "w") as file:
+        json.dump(changes, file)
+
+def record_change(task_id, task):
+    with _changes_lock:
+        changes = load_changes(cached=False)
+        version = changes["version"] + 1
+        log = changes["changes"] + [[version, str(task_id), dict(task)]]
+        log_start = changes["log_start"]
+        if len(log) > MAX_CHANGES:
+            log_start = log[-MAX_CHANGES - 1][0]
+            log = log[-MAX_CHANGES:]
+        save_changes({"version": version, "log_start": log_start, "changes": log})
+
+def reset_changes():
+    with _changes_lock:
+        version = load_changes(cached=False)["version"] + 1
+        save_changes({"version": version, "log_start": version, "changes": []})
+
+def get_task_changes(since):
+    """
+    Returns the tasks added or updated after version `since`.
+    If those changes are no longer in the log, the full task list is returned with "reset" set.
+    """
+    changes = load_changes()
+    version = changes["version"]
+    if changes["log_start"] <= since <= version:
+        tasks = {task_id: task for change_version, task_id, task in changes["changes"] if change_version > since}
+        return {"version": version, "reset": False, "tasks": tasks}
+    return {"version": version, "reset": True, "tasks": load_tasks() or {}}
+
+# Search index over the open tasks, built from the file on first use
+_task_index = None
+_task_index_lock = threading.Lock()
+
+def _build_task_index():
+    index = TaskIndex()
+    for id, task in (load_tasks() or {}).items():
+        if not task.get("completed"):
+            index.add(id, task["description"])
+    return index
+
+def get_task_index():
+    global _task_index
+    if _task_index is None:
+        with _task_index_lock:
+            if _task_index is None:
+                _task_index = _build_task_index()
+    return _task_index
+
+def rebuild_task_index():
+    global _task_index
+    with _task_index_lock:
+        _task_index = _build_task_index()
+    return _task_index
+
+def search_open_tasks(query, limit=5, min_score=0.3):
+    """
+    Searches the index and checks the results against the tasks file.
+    The file is shared with other processes, so the index is rebuilt when it no longer matches the open tasks.
+
+    Returns:
+        tuple: (tasks, results) with the loaded tasks and the (task_id, description, score) matches.
+    """
+    tasks = load_tasks() or {}
+    index = get_task_index()
+    results = index.search(query, limit=limit, min_score=min_score)
+    open_tasks = sum(1 for task in tasks.values() if not task.get("completed"))
+    stale = len(index) != open_tasks or any(
+        tasks.get(task_id, {}).get("completed", True) or tasks[task_id].get("description") != description
+        for task_id, description, score in results
+    )
+    if stale:
+        results = rebuild_task_index().search(query, limit=limit, min_score=min_score)
+    return tasks, results
+
+# A name only selects a task when its score is high and clearly ahead of the next match.
+# Scores go up to 1.5, which means every word of the name appears in the task.
+MATCH_SCORE = 1.2
+MATCH_MARGIN = 0.3
+CANDIDATE_SCORE = 0.5
+
+def find_task(task_info):
+    """
+    Finds the task meant by a task number or a task name.
+
+    Returns:
+        tuple: (task_id, candidates). task_id is None when there is no confident match,
+        in which case candidates lists the (task_id, description, score) of possible matches.
+    """
+    tasks = load_tasks() or {}
+    task_id = str(task_info).strip()
+    if task_id in tasks:
+        return task_id, []
+
+    # A number only ever refers to a task id, never to a task name
+    words = tokenize(task_info)
+    if words and all(word.isdigit() for word in words):
+        if len(words) == 1 and words[0] in tasks:
+            return words[0], []
+        return None, []
+
+    results = search_open_tasks(task_info, limit=3, min_score=CANDIDATE_SCORE)[1]
+    if results:
+        best_score = results[0][2]
+        next_score = results[1][2] if len(results) > 1 else 0
+        if best_score >= MATCH_SCORE and best_score - next_score >= MATCH_MARGIN:
+            return results[0][0], []
+    return None, results
+
+def candidates_message(task_info, candidates):
+    """
+    Asks the user to confirm which task they meant, or reports that none matched.
+    """
+    if not candidates:
+        return (
+            f'The task "{task_info}" is not in your current list.\n'
+            "You can add this task to your list or check the existing tasks for a similar one."
+        )
+    options = "\n".join(f"{task_id}. {description}" for task_id, description, score in candidates)
+    return (
+        f'I am not sure which task you mean by "{task_info}". Did you mean one of these?\n'
+        f"{options}\n"
+        "Please repeat your request with the task number."
+    )
+
+# Function to search the open tasks by name
+def search_tasks(query, limit=5):
+    return [
+        {"id": task_id, "description": description, "score": score}
+        for task_id, description, score in search_open_tasks(query, limit=limit)[1]
+    ]
+
+
 # Function to add a task
 def add_task(task_description):
     if not task_description:
         return "Task description cannot be empty."
     
     tasks = load_tasks()
-    tasks[len(tasks)+1] = {"description": task_description, "completed": False}
+    task_id = str(len(tasks)+1)
+    tasks[task_id] = {"description": task_description, "completed": False}
     save_tasks(tasks)
+    record_change(task_id, tasks[task_id])
+    get_task_index().add(task_id, task_description)
     return f"Task added: {task_description}"
 
 # Function to list all tasks
@@ -79,51 +230,50 @@ def list_tasks():
         return "No tasks available."
     return "\n".join([f"{id}. {task['description']} [{task['completed']}]" for id, task in tasks.items()])
 
-# Function to delete a task
-def delete_task(task_index):
+# Function to delete a task by id or name
+def delete_task(task_info):
+    task_id, candidates = find_task(task_info)
+    if task_id is None:
+        return candidates_message(task_info, candidates)
     tasks = load_tasks()
-    try:
-        tasks[task_index]["completed"] = True
-        save_tasks(tasks)
-        return f"Task removed: {tasks[task_index]['description']}"
-    except IndexError:
-        return "Invalid task number. Please provide a valid task index."
+    tasks[task_id]["completed"] = True
+    save_tasks(tasks)
+    record_change(task_id, tasks[task_id])
+    get_task_index().remove(task_id)
+    return f"Task removed: {tasks[task_id]['description']}"
     
 
 def clear_tasks_json():
     tasks = {}
     save_tasks(tasks)
+    reset_changes()
+    get_task_index().clear()
     return "All tasks have been cleared."
 
 
 def help_task(task_info):
     """
-    Returns a system prompt to provide the user with instructions about a specific task.
+    Provides the user with instructions about a specific task.
+    The task is matched locally, so only its description is sent to the model.
     If the task is not in the list, returns a corresponding message.
     """
     
-    task_list = list_tasks()
+    task_id, candidates = find_task(task_info)
+    if task_id is None:
+        return candidates_message(task_info, candidates)
     
-    print(task_list)
+    task_description = load_tasks()[task_id]["description"]
     
-    system_prompt = f"""
+    system_prompt = """
         You are an assistant helping a user with a specific task from his list.
         
-        This is the user's task list:
-        {task_list}
-        
-        If task is not in the user's list return a message such as:
-        "The task "<task name>" is not in your current list.
-        You can add this task to your list or check the existing tasks for a similar one."
-        
-        If the task exists in the list:
         Here are the instructions for this task:
         1. Provide a detailed step-by-step guide to accomplish this task.
         2. Suggest resources or tools the user might need.
         3. If the task involves specific technologies or methods, provide examples or best practices.
     """
     
-    response = get_model_response(f"Please give me instructions for the task {task_info}", system_prompt)
+    response = get_model_response(f"Please give me instructions for the task {task_description}", system_prompt)
     
     return response
 
@@ -135,7 +285,7 @@ def handle_task_command(subcategory, task_info):
 
     Parameters:
         subcategory (str): The specific task action, e.g., "add", "help", "delete".
-        task_info (str): Additional information about the task (e.g., description or index).
+        task_info (str): Additional information about the task (e.g., description, index or name).
 
     Returns:
         str: Result of the command execution.
@@ -145,11 +295,7 @@ def handle_task_command(subcategory, task_info):
     elif subcategory == "help":
         return help_task(task_info)
     elif subcategory == "delete":
-        try:
-            task_index = str(task_info)
-            return delete_task(task_index)
-        except ValueError:
-            return "Invalid task index. Please provide a valid number."
+        return delete_task(task_info)
     else:
         return f"Unknown task command: {subcategory}. Supported commands are 'add', 'list', and 'delete'."
 
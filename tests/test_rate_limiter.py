@@ -0,0 +1,96 @@
+import json
+import types
+
+import pytest
+
+import rate_limiter
+from rate_limiter import AdmissionController, AdmissionRejected
+
+
+def make_controller(openai_rpm=60, max_wait=0.1):
+    return AdmissionController(
+        openai_rpm=openai_rpm,
+        openai_tpm=100000,
+        calendar_qps=1,
+        user_rpm=600,
+        user_burst=10,
+        max_wait=max_wait,
+    )
+
+
+def test_admission_reserves_fixed_message_cost():
+    controller = make_controller(openai_rpm=3)
+
+    with controller.request("alice", openai_requests=2, openai_tokens=100):
+        # Calls paid from the reservation do not take more budget
+        controller.acquire_openai(50)
+        controller.acquire_openai(50)
+        assert controller.buckets["openai_requests"].tokens == pytest.approx(1, abs=0.01)
+
+    with pytest.raises(AdmissionRejected):
+        with controller.request("bob", openai_requests=2, openai_tokens=100):
+            pass
+
+
+def test_unused_reservation_is_returned():
+    controller = make_controller()
+
+    with controller.request("alice", openai_requests=2, openai_tokens=100):
+        controller.reserve(openai_requests=3, openai_tokens=300, calendar=1)
+        controller.acquire_openai(50)
+
+    assert controller.buckets["openai_requests"].tokens == pytest.approx(59, abs=0.01)
+    assert controller.buckets["calendar"].tokens == pytest.approx(1, abs=0.01)
+
+
+def test_google_quota_errors_are_rate_limits(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_controller", make_controller())
+    error = Exception("quota")
+    error.resp = {"status": "403"}
+    error.status_code = 403
+    error.content = json.dumps({"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}).encode()
+
+    with pytest.raises(AdmissionRejected):
+        rate_limiter.raise_if_rate_limited(error, ["calendar"])
+
+    error.content = json.dumps({"error": {"errors": [{"reason": "forbidden"}]}}).encode()
+    rate_limiter.raise_if_rate_limited(error, ["calendar"])
+
+
+def test_overloaded_message_makes_no_provider_calls(monkeypatch):
+    pytest.importorskip("flask")
+    import app
+
+    import clients
+
+    calls = []
+    moderation = types.SimpleNamespace(results=[types.SimpleNamespace(flagged=False)])
+    completion = types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=json.dumps({"classification": [], "details": []})))]
+    )
+
+    def moderate(input):
+        calls.append("moderation")
+        return moderation
+
+    def complete(**kwargs):
+        calls.append("completion")
+        return completion
+
+    client = types.SimpleNamespace(
+        moderations=types.SimpleNamespace(create=moderate),
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=complete)),
+    )
+    monkeypatch.setattr(app, "get_openai_client", lambda: client)
+    monkeypatch.setattr(clients, "get_openai_client", lambda: client)
+    monkeypatch.setattr(rate_limiter, "_controller", make_controller(openai_rpm=3))
+
+    test_client = app.app.test_client()
+    first = test_client.post("/process", data=json.dumps({"user_input": "hello"}))
+    assert first.status_code == 200
+    assert len(calls) == 2
+
+    second = test_client.post("/process", data=json.dumps({"user_input": "hello"}))
+    assert second.status_code == 503
+    assert "Retry-After" in second.headers
+    assert len(calls) == 2
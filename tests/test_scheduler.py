@@ -0,0 +1,16 @@
+import pytest
+
+import scheduler
+
+
+def test_calendar_connection_is_not_pooled_without_service(monkeypatch):
+    monkeypatch.setattr(scheduler, "get_calendar_service", lambda: None)
+
+    with pytest.raises(RuntimeError):
+        with scheduler.calendar_connection():
+            pass
+    assert scheduler._http_pool.empty()
+
+    # The warm-up reports the failure instead of raising at import time
+    scheduler.warm_up_calendar()
+    assert scheduler._http_pool.empty()
@@ -0,0 +1,76 @@
+"""
+Startup benchmarks: importing the app must not load the heavy API clients,
+and the time to the first response is measured and reported.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import types
+
+import pytest
+
+pytest.importorskip("flask")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = ["openai", "googleapiclient", "google_auth_oauthlib"]
+
+
+def test_import_does_not_load_api_clients():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    # Each importtime line ends with the dotted module name, indented by nesting level
+    imported = {
+        line.rsplit("|", 1)[-1].strip().split(".")[0]
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    for module in LAZY_MODULES:
+        assert module not in imported
+
+
+def test_time_to_first_response(monkeypatch, tmp_path, record_property):
+    start = time.perf_counter()
+    import app
+    import task_manager
+    import_seconds = time.perf_counter() - start
+
+    # Stub the providers so the measurement covers only the app's own work
+    moderation = types.SimpleNamespace(results=[types.SimpleNamespace(flagged=False)])
+    client = types.SimpleNamespace(moderations=types.SimpleNamespace(create=lambda input: moderation))
+    responses = {
+        "classify": {"classification": [{"category": "task"}], "details": ["add task: Cook spaghetti"]},
+        "manage tasks": {"task_action": "add", "details": "Cook spaghetti"},
+    }
+
+    def model_response(user_input, system_message):
+        for keyword, response in responses.items():
+            if keyword in system_message:
+                return json.dumps(response)
+
+    monkeypatch.setattr(app, "get_openai_client", lambda: client)
+    monkeypatch.setattr(app, "get_model_response", model_response)
+    tasks_file = tmp_path / "tasks.json"
+    tasks_file.write_text("{}")
+    monkeypatch.setattr(task_manager, "TASKS_FILE", str(tasks_file))
+    monkeypatch.setattr(task_manager, "CHANGES_FILE", str(tmp_path / "tasks_changes.json"))
+    monkeypatch.setattr(task_manager, "_task_index", None)
+
+    start = time.perf_counter()
+    response = app.app.test_client().post("/process", data=json.dumps({"user_input": "Add a task to cook spaghetti"}))
+    first_response_seconds = time.perf_counter() - start
+
+    assert response.status_code == 200
+    assert response.get_json()["response"] == "Task added: Cook spaghetti"
+    record_property("import_seconds", round(import_seconds, 4))
+    record_property("first_response_seconds", round(first_response_seconds, 4))
+    print(f"import: {import_seconds:.4f}s, first /process: {first_response_seconds:.4f}s")
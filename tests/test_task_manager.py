@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+import task_manager
+
+
+@pytest.fixture
+def tasks_file(tmp_path, monkeypatch):
+    path = tmp_path / "tasks.json"
+    path.write_text("{}")
+    monkeypatch.setattr(task_manager, "TASKS_FILE", str(path))
+    monkeypatch.setattr(task_manager, "CHANGES_FILE", str(tmp_path / "tasks_changes.json"))
+    monkeypatch.setattr(task_manager, "_task_index", None)
+    for description in [
+        "Finish Platon project",
+        "Write Google docs report",
+        "Buy 7 apples",
+        "Cook spaghetti",
+        "Finish quarterly report",
+        "Read chapters 3 4",
+    ]:
+        task_manager.add_task(description)
+    return path
+
+
+def test_names_resolve_to_a_task(tasks_file):
+    assert task_manager.find_task("the spaghetti task") == ("4", [])
+    assert task_manager.find_task("Platon project") == ("1", [])
+
+
+def test_ambiguous_name_returns_candidates(tasks_file):
+    task_id, candidates = task_manager.find_task("report")
+
+    assert task_id is None
+    assert {candidate[0] for candidate in candidates} == {"2", "5"}
+
+    task_manager.delete_task("report")
+    tasks = json.loads(tasks_file.read_text())
+    assert not any(task["completed"] for task in tasks.values())
+
+
+def test_numbers_are_never_fuzzy_matched(tasks_file):
+    assert task_manager.find_task("7") == (None, [])
+    assert task_manager.find_task("3 4") == (None, [])
+    assert task_manager.find_task("task 3") == ("3", [])
+
+
+def test_completed_task_drops_out_of_index(tasks_file):
+    task_manager.delete_task("spaghetti")
+
+    assert task_manager.search_tasks("spaghetti") == []
+    assert task_manager.find_task("spaghetti") == (None, [])
+
+
+def test_index_follows_changes_from_other_processes(tasks_file):
+    assert task_manager.find_task("spaghetti") == ("4", [])
+
+    # Another worker clears the list and adds a new task with the same id
+    tasks_file.write_text(json.dumps({"4": {"description": "Do the laundry", "completed": False}}))
+
+    assert task_manager.delete_task("spaghetti").startswith('The task "spaghetti" is not in your current list.')
+    assert json.loads(tasks_file.read_text())["4"]["completed"] is False
+    assert task_manager.find_task("laundry") == ("4", [])
+
+
+@pytest.fixture
+def changes_file(tmp_path, monkeypatch):
+    path = tmp_path / "tasks_changes.json"
+    monkeypatch.setattr(task_manager, "CHANGES_FILE", str(path))
+    (tmp_path / "tasks.json").write_text("{}")
+    monkeypatch.setattr(task_manager, "TASKS_FILE", str(tmp_path / "tasks.json"))
+    monkeypatch.setattr(task_manager, "_task_index", None)
+    return path
+
+
+def test_changes_since_version_are_returned(changes_file):
+    version = task_manager.get_task_changes(0)["version"]
+    task_manager.add_task("Cook spaghetti")
+    task_manager.add_task("Tidy room")
+
+    changes = task_manager.get_task_changes(version)
+    assert changes["reset"] is False
+    assert changes["tasks"] == {
+        "1": {"description": "Cook spaghetti", "completed": False},
+        "2": {"description": "Tidy room", "completed": False},
+    }
+
+    task_manager.delete_task("1")
+    changes = task_manager.get_task_changes(changes["version"])
+    assert changes["reset"] is False
+    assert changes["tasks"] == {"1": {"description": "Cook spaghetti", "completed": True}}
+
+
+def test_clear_resets_the_client(changes_file):
+    task_manager.add_task("Cook spaghetti")
+    version = task_manager.get_task_changes(0)["version"]
+
+    task_manager.clear_tasks_json()
+
+    changes = task_manager.get_task_changes(version)
+    assert changes["reset"] is True
+    assert changes["tasks"] == {}
+    assert changes["version"] > version
+
+
+def test_version_newer_than_log_resets_the_client(changes_file):
+    task_manager.add_task("Cook spaghetti")
+    version = task_manager.get_task_changes(0)["version"]
+
+    changes = task_manager.get_task_changes(version + 100)
+    assert changes["reset"] is True
+    assert list(changes["tasks"]) == ["1"]
+
+
+def test_changes_older_than_log_reset_the_client(changes_file, monkeypatch):
+    monkeypatch.setattr(task_manager, "MAX_CHANGES", 3)
+    version = task_manager.get_task_changes(0)["version"]
+    for number in range(3):
+        task_manager.add_task(f"Task {number}")
+
+    # The first three changes still fit in the log
+    assert task_manager.get_task_changes(version)["reset"] is False
+
+    task_manager.add_task("Task 3")
+    assert task_manager.get_task_changes(version)["reset"] is True
+    changes = task_manager.get_task_changes(version + 1)
+    assert changes["reset"] is False
+    assert len(changes["tasks"]) == 3
+
+
+def test_changes_are_shared_between_processes(changes_file):
+    version = task_manager.get_task_changes(0)["version"]
+    task_manager.add_task("Cook spaghetti")
+
+    # Another worker reads the log from the file, not from this process's memory
+    task_manager._changes_cache = None
+    changes = task_manager.get_task_changes(version)
+    assert changes["reset"] is False
+    assert list(changes["tasks"]) == ["1"]
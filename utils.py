@@ -39,6 +39,12 @@ def get_task_prompt():
     - Input: "Please help me with the task 3"
       Output: {"task_action": "help", "details": "3"}
       
+    - Input: "Delete the spaghetti task."
+      Output: {"task_action": "delete", "details": "spaghetti"}
+      
+    - Input: "Help me with the Platon project."
+      Output: {"task_action": "help", "details": "Platon project"}
+      
     Ensure responses strictly follow this JSON format.
     """
 